@@ -1,18 +1,26 @@
 import argparse, os, time, sys
 import re
+import functools
+import urllib.parse
+import hashlib
+import shlex
+import stat
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import yaml
-from qbittorrentapi import Client, LoginFailed
-from typing import Dict, List, Tuple
+from qbittorrentapi import Client, LoginFailed, NotFound404Error
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
 
 import pandas as pd
 import numpy as np
 
 def load_config(config_path: str) -> Dict:
+    # Returns the whole document, the qbit section holds the connection settings
     try:
         with open(config_path) as f:
             config = yaml.safe_load(f)
-            return config['qbit']
+            return config
     except FileNotFoundError:
         print("Error: config.yml not found")
         exit(1)
@@ -29,7 +37,276 @@ def connect_qbit(config: Dict) -> Client:
     except LoginFailed:
         print("Error: Failed to connect to QBittorrent")
         exit(1)
-        
+
+class ProgressStream:
+    # Stands in for sys.stdout while a progress line is drawn on a terminal. Any other output (warnings, prints
+    # between phases) first clears the progress line, so it does not end up glued to the bar.
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        if text:
+            Progress.clear_line()
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class Progress:
+    # Shared progress renderer. Redraws are rate limited by time, so a loop over millions of files costs one
+    # counter increment and one clock read per iteration. On a terminal a single line is redrawn in place,
+    # otherwise (cron, pipes, log files) a structured status line is printed every status_interval seconds.
+    refresh_interval = 0.2  # seconds between two redraws on a terminal
+    status_interval = 60  # seconds between two status lines when not writing to a terminal, set by --status-interval
+    active = []  # phases that are currently running, outermost first
+    drawn = 0  # length of the progress line currently on the terminal
+    stdout = None  # the real sys.stdout while it is replaced by a ProgressStream
+
+    def __init__(self, name: str, total: int = None, enabled: bool = True, show_rate: bool = True):
+        # show_rate=False for phases counting a few coarse steps, where throughput and ETA are meaningless
+        self.name = name
+        self.total = total
+        self.enabled = enabled
+        self.show_rate = show_rate
+        self.current = 0
+        self.stream = Progress.stdout or sys.stdout
+        self.tty = self.stream.isatty()
+        self.start = time.monotonic()
+        self.next_render = self.start + (self.refresh_interval if self.tty else self.status_interval)
+        if enabled:
+            if self.tty and Progress.stdout is None:
+                Progress.stdout = sys.stdout
+                sys.stdout = ProgressStream(sys.stdout)
+            Progress.active.append(self)
+
+    @classmethod
+    def clear_line(cls):
+        if cls.drawn:
+            cls.stdout.write('\r' + ' ' * cls.drawn + '\r')
+            cls.drawn = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update(self, n: int = 1):
+        self.current += n
+        if self.enabled and time.monotonic() >= self.next_render:
+            self.render()
+
+    def rate(self, now: float) -> float:
+        elapsed = now - self.start
+        return self.current / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, now: float) -> float:
+        rate = self.rate(now)
+        if self.total is None or rate == 0:
+            return None
+        return max(0, self.total - self.current) / rate
+
+    def describe(self, now: float) -> str:
+        if Progress.active[-1] is not self:
+            # outer phases only show where we are, throughput and ETA are shown for the innermost phase
+            return f"{self.name} {min(self.current + 1, self.total)}/{self.total}" if self.total else self.name
+        text = self.name
+        if self.total:
+            text += " ["+"#"*int(min(self.current, self.total)*20/self.total)+" "*(20-int(min(self.current, self.total)*20/self.total))+"] "+f"{100*self.current//self.total}% {self.current}/{self.total}"
+        else:
+            text += f" {self.current}"
+        if self.show_rate:
+            eta = self.eta(now)
+            text += f" {self.rate(now):.1f}/s"
+            if eta is not None:
+                text += f" ETA {format_duration(eta)}"
+        return text
+
+    def status_line(self, now: float, state: str) -> str:
+        phase = '/'.join(p.name for p in Progress.active) if self in Progress.active else self.name
+        fields = [f'phase="{phase}"', f"state={state}", f"current={self.current}"]
+        if self.total is not None:
+            fields.append(f"total={self.total}")
+            if self.total > 0:
+                fields.append(f"percent={100*self.current/self.total:.1f}")
+        if self.show_rate:
+            fields.append(f"rate={self.rate(now):.1f}/s")
+        fields.append(f"elapsed={now - self.start:.0f}s")
+        eta = self.eta(now)
+        if self.show_rate and eta is not None and state == 'running':
+            fields.append(f"eta={eta:.0f}s")
+        return f"{time.strftime('%Y-%m-%dT%H:%M:%S')} progress " + ' '.join(fields)
+
+    def render(self):
+        now = time.monotonic()
+        if self.tty:
+            line = ' > '.join(p.describe(now) for p in Progress.active)
+            self.stream.write('\r' + line + ' ' * max(0, Progress.drawn - len(line)))
+            Progress.drawn = len(line)
+            self.next_render = now + self.refresh_interval
+        else:
+            self.stream.write(self.status_line(now, 'running') + '\n')
+            self.next_render = now + self.status_interval
+        self.stream.flush()
+
+    def close(self):
+        if not self.enabled or self not in Progress.active:
+            return
+        now = time.monotonic()
+        if self.tty:
+            # clear the line, so whatever is printed next starts on a clean line
+            Progress.clear_line()
+        else:
+            self.stream.write(self.status_line(now, 'done') + '\n')
+        self.stream.flush()
+        Progress.active.remove(self)
+        if not Progress.active and Progress.stdout is not None:
+            sys.stdout = Progress.stdout
+            Progress.stdout = None
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+@functools.lru_cache(maxsize=4096)
+def tracker_host(url: str) -> str:
+    # Cached, there are usually only a few dozen distinct tracker URLs across all torrents
+    parts = urllib.parse.urlsplit(url)
+    if parts.hostname:
+        return parts.hostname
+    return url.split('/')[0]
+
+DEFAULT_MESSAGE_RULES = [
+    # Checked in order, the first rule whose pattern (and tracker, if given) matches wins.
+    # 'message' optionally replaces the raw message, so messages with varying numbers end up in one group.
+    {'category': 'rate-limited', 'pattern': r'^You last announced', 'message': 'You last announced X s ago. Please respect the min interval.'},
+    {'category': 'rate-limited', 'pattern': r'min(imum)? (announce )?interval|too many requests|rate limit|slow down'},
+    # errors that hit every torrent of a tracker go before the torrent specific categories
+    {'category': 'auth-failure', 'pattern': r'passkey|auth.?key|torrent.?pass|unauthori[sz]ed|invalid key|login|forbidden|\b403\b'},
+    {'category': 'banned', 'pattern': r'banned|blacklist|client.*not (allowed|whitelisted|approved)'},
+    {'category': 'unreachable', 'pattern': r'timed? ?out|connection refused|host not found|could not resolve|unreachable|end of file|ssl|certificate|bad gateway|service unavailable|internal server error|\b404\b|\b50[0-4]\b'},
+    {'category': 'unregistered', 'pattern': r'unregistered|not registered|torrent not found|torrent does not exist|unknown torrent|info.?hash not found|torrent (is )?not authori[sz]ed'},
+    {'category': 'deleted', 'pattern': r'deleted|removed|trumped|nuked|dupe'},
+]
+
+def load_message_rules(config: Dict, config_path: str) -> List[Dict]:
+    # Rules from the optional tracker_messages section of the config are checked before the default rules
+    rules = config.get('tracker_messages') or []
+    if not isinstance(rules, list):
+        print(f"Error: tracker_messages in {config_path} must be a list of rules")
+        exit(1)
+    for i, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict) or not isinstance(rule.get('category'), str) or not isinstance(rule.get('pattern'), str):
+            print(f"Error: tracker_messages rule #{i} in {config_path} needs a 'category' and a 'pattern': {rule}")
+            exit(1)
+        for key in ('pattern', 'tracker'):
+            try:
+                re.compile(rule.get(key) or '')
+            except re.error as e:
+                print(f"Error: tracker_messages rule #{i} in {config_path} has an invalid {key} regex {rule[key]!r}: {e}")
+                exit(1)
+    return rules + DEFAULT_MESSAGE_RULES
+
+class TrackerMessageClassifier:
+    def __init__(self, rules: List[Dict] = DEFAULT_MESSAGE_RULES):
+        self.rules = [(rule['category'],
+                       re.compile(rule['pattern'], re.IGNORECASE),
+                       re.compile(rule['tracker'], re.IGNORECASE) if rule.get('tracker') else None,
+                       rule.get('message')) for rule in rules]
+        # Map a raw tracker message to (category, normalized message), memoized per distinct (host, message).
+        # Bounded, since messages carrying counters or ids keep producing new keys in a long running serve-metrics.
+        self.classify = functools.lru_cache(maxsize=4096)(self._classify)
+
+    def _classify(self, host: str, msg: str) -> Tuple[str, str]:
+        if not msg:
+            return ('none', msg)
+        for category, pattern, tracker, message in self.rules:
+            if tracker and not tracker.search(host):
+                continue
+            if pattern.search(msg):
+                return (category, message or msg)
+        return ('other', msg)
+
+def parse_sample(value: str) -> Tuple[str, float]:
+    # argparse type for --sample: either an absolute number of torrents ("500") or a percentage ("5%")
+    value = value.strip()
+    try:
+        if value.endswith('%'):
+            percent = float(value[:-1])
+            if not 0 < percent <= 100:
+                raise argparse.ArgumentTypeError(f"sample percentage must be in (0, 100], got {value}")
+            return ('fraction', percent / 100)
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid sample size {value!r}, expected N or P%")
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"sample size must be at least 1, got {value}")
+    return ('count', count)
+
+def sample_stratum(torrent) -> Tuple[str, str]:
+    # Stratify by tracker and category, using only fields of torrents_info(), so no extra API call is needed per torrent.
+    # torrent.tracker is the current *working* tracker and is empty when no announce succeeded (e.g. unregistered
+    # torrents), so fall back to the first tracker listed in the magnet URI.
+    url = torrent.tracker
+    if not url and torrent.magnet_uri:
+        url = (urllib.parse.parse_qs(urllib.parse.urlsplit(torrent.magnet_uri).query).get('tr') or [''])[0]
+    tracker = tracker_host(url) if url else 'No tracker'
+    return (tracker, torrent.category or '')
+
+def stratified_sample(torrents, sample: Tuple[str, float], seed: int = None) -> Tuple[list, Dict]:
+    # Proportional allocation with at least 2 torrents per stratum, so every stratum contributes to the variance.
+    # Strata too small to get 2 torrents by proportion are merged into one, to keep the sample close to the request.
+    # Returns the sampled torrents and a dict stratum: {'population': N_h, 'hashes': [sampled hashes]}
+    strata = defaultdict(list)
+    for torrent in torrents:
+        strata[sample_stratum(torrent)].append(torrent)
+    population = sum(len(members) for members in strata.values())
+    kind, amount = sample
+    target = min(population, amount if kind == 'count' else int(np.ceil(amount * population)))
+    small = [key for key, members in strata.items() if target * len(members) / population < 2]
+    if len(small) > 1:
+        strata[('Small strata', '')] = [torrent for key in small for torrent in strata.pop(key)]
+
+    rng = np.random.default_rng(seed)
+    sampled = []
+    strata_info = {}
+    for key in sorted(strata.keys()):
+        members = strata[key]
+        n = min(len(members), max(2, int(round(target * len(members) / population))))
+        picked = [members[i] for i in rng.choice(len(members), size=n, replace=False)]
+        sampled.extend(picked)
+        strata_info[key] = {'population': len(members), 'hashes': [torrent.hash for torrent in picked]}
+    if len(sampled) != target:
+        print(f"Warning: sampling {len(sampled)} torrents instead of the requested {target}, every stratum needs at least 2 torrents")
+    print(f"Sampling {len(sampled)} of {population} torrents in {len(strata_info)} strata (tracker x category)")
+    return sampled, strata_info
+
+def extrapolate(strata_info: Dict, values: Dict[str, float], z: float = 1.96) -> Tuple[float, float]:
+    # Stratified estimate of a population total from per-torrent sample values (missing hashes count as 0).
+    # Returns the estimate and the half width of its confidence interval (95% for the default z).
+    total = 0.0
+    variance = 0.0
+    for info in strata_info.values():
+        population = info['population']
+        observed = np.array([values.get(h, 0.0) for h in info['hashes']], dtype=float)
+        n = len(observed)
+        if n == 0:
+            continue
+        total += population * observed.mean()
+        if n > 1 and n < population:
+            variance += population ** 2 * (1 - n / population) * observed.var(ddof=1) / n
+    return total, z * np.sqrt(variance)
+
+def print_sample_estimates(strata_info: Dict, label: str, counts: Dict[str, float], sizes: Dict[str, float]):
+    population = sum(info['population'] for info in strata_info.values())
+    sampled = sum(len(info['hashes']) for info in strata_info.values())
+    count, count_ci = extrapolate(strata_info, counts)
+    size, size_ci = extrapolate(strata_info, sizes)
+    print('-' * 120)
+    print(f"Sampled {sampled} of {population} torrents in {len(strata_info)} strata (tracker x category)")
+    print(f"Estimated {label}: {count:.0f} ± {count_ci:.0f} torrents (95% CI)")
+    print(f"Estimated reclaimable size (TiB): {size / (1024 ** 4):.2f} ± {size_ci / (1024 ** 4):.2f} (95% CI)")
+
 def qbit_status(client: Client):
     try:
         print("Connected to qBittorrent. Version:", client.app_version())
@@ -50,11 +327,13 @@ def overview_torrents(client: Client):
     print(f"Total Ratio: {(sum(torrent.uploaded for torrent in torrents) / sum(torrent.downloaded for torrent in torrents)):.2f}")
     print(f"Ratio sum: {sum(torrent.ratio for torrent in torrents) / len(torrents):.2f}")
 
-def list_tracker_messages(client: Client, no_progress: bool = False, tracker_regex: list[str] = [], message_regex: list[str] = [], hash_regex: list[str] = [], torrent_regex: list[str] = [], full: bool = False, delete: bool = False, yes_do_as_i_say: bool = False, path_prefix: str = ''):
+def list_tracker_messages(client: Client, no_progress: bool = False, tracker_regex: list[str] = [], message_regex: list[str] = [], hash_regex: list[str] = [], torrent_regex: list[str] = [], full: bool = False, delete: bool = False, yes_do_as_i_say: bool = False, path_prefix: str = '', sample: Tuple[str, float] = None, sample_seed: int = None, category_regex: list[str] = [], message_rules: List[Dict] = DEFAULT_MESSAGE_RULES):
+    classifier = TrackerMessageClassifier(message_rules)
     tracker_matches = [re.compile(tr, re.IGNORECASE) for tr in tracker_regex] if tracker_regex else []
     message_matches = [re.compile(msg, re.IGNORECASE) for msg in message_regex] if message_regex else []
     hash_matches = [re.compile(h, re.IGNORECASE) for h in hash_regex] if hash_regex else []
     torrent_matches = [re.compile(t, re.IGNORECASE) for t in torrent_regex] if torrent_regex else []
+    category_matches = [re.compile(c, re.IGNORECASE) for c in category_regex] if category_regex else []
     trackers = defaultdict(lambda: {'count': 0, 'size': 0})
     torrent_files = {} # file: [torrents]
     
@@ -62,14 +341,15 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
     print("Client app_default_save_path: "+client.app_default_save_path())
     
 
-    df = pd.DataFrame(columns=['Torrent Name', 'Tracker', 'Hash', 'Size', 'Files', 'Status', 'Tracker Status', 'Message'])
+    df = pd.DataFrame(columns=['Torrent Name', 'Tracker', 'Hash', 'Size', 'Files', 'Status', 'Tracker Status', 'Category', 'Message'])
     
-    total = len(client.torrents_info())
-    current = 0
-    for torrent in client.torrents_info():
-        current += 1
-        if not no_progress:
-            print("["+"#"*int(current*20/total)+" "*int((total-current)*20/total)+"] "+f"{(100*current//total)}% {current}/{total}", end='\r')
+    torrents = client.torrents_info()
+    strata_info = None
+    if sample:
+        torrents, strata_info = stratified_sample(torrents, sample, sample_seed)
+    progress = Progress("Get trackers of torrents", len(torrents), enabled=not no_progress)
+    for torrent in torrents:
+        progress.update()
         trackerlist = client.torrents_trackers(torrent.hash)
         if not trackerlist:
             print(f"Warning: No trackers found for torrent {torrent.name}")
@@ -87,9 +367,7 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
             tracker_obj = tracker
             if tracker_obj.get('url', '').startswith('**'):
                 continue
-            msg = tracker_obj.get('msg', 'No Message')
-            if msg.startswith('You last announced'):
-                msg = "You last announced X s ago. Please respect the min interval."
+            category, msg = classifier.classify(tracker_host(tracker_obj.get('url', '')), tracker_obj.get('msg', 'No Message'))
             if not tracker_obj:
                 print(f"Warning: No enabled trackers found for torrent {torrent.name}")
                 continue
@@ -111,14 +389,17 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
                 continue
             if torrent_matches and not any(torrent_match.search(torrent.name) for torrent_match in torrent_matches):
                 continue
+            if category_matches and not any(category_match.search(category) for category_match in category_matches):
+                continue
             df = pd.concat([df, pd.DataFrame({  # Corrected to use pd.concat with a list
                 'Torrent Name': [torrent.name],
-                'Tracker': [tracker_obj.get('url', 'https://no.tracker').replace('http://', '').replace('https://', '').split('/')[0]],
+                'Tracker': [tracker_host(tracker_obj.get('url', 'https://no.tracker'))],
                 'Hash': [torrent.hash],
                 'Size': [torrent.size],
                 'Files': "	".join([file.name for file in torrent.files]),
                 'Status': [torrent.state_enum.name],
                 'Tracker Status': [tracker_obj.get('status', 'No status')],
+                'Category': [category],
                 'Message': [msg]
             })], ignore_index=True)  # Added DataFrame constructor
             break  # Only take the first tracker that fits the criteria
@@ -126,10 +407,11 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
             print(f"Warning: No fitting trackers found for torrent {torrent.name}")
             continue
         tracker_url = tracker_obj.get('url', 'No URL')
-        tracker = tracker_url.replace('https://', '').replace('http://', '').split('/')[0]
+        tracker = tracker_host(tracker_url)
         trackers[tracker]['count'] += 1
         trackers[tracker]['size'] += torrent.size
         trackers[tracker]['message'] = msg  # Store last message for demo
+    progress.close()
     
     
     # Print the 10 most used files
@@ -145,11 +427,17 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
     to_delete_torrents = []
     to_delete_files = []
     
+    print("")
+    print(f"{'Message category':<30} {'Count':>10} {'Size (TiB)':>15}")
+    print('-' * 60)
+    for category, data in df.groupby('Category').agg({'Size': 'sum', 'Hash': 'count'}).sort_values(by='Hash', ascending=False).iterrows():
+        print(f"{category:<30} {int(data['Hash']):>10} {data['Size'] / (1024 ** 4):>15.2f}")
+
     # Loop over all message types, sorted by amount of torrents with that message
     message_counts = df['Message'].value_counts()
     for message, count in message_counts.items():
         print('-' * 120)
-        print(f"{message}: {count} torrents")
+        print(f"[{df[df['Message'] == message]['Category'].iloc[0]}] {message}: {count} torrents")
         print("")
         # print table of indexers, the count of torrents and the sum of of torrent sizes per indexer
         print(f"    {'Tracker':<60} {'Count':>10} {'Size (GiB)':>15}")
@@ -198,7 +486,15 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
             if list_torrents_count > 10:
                 print(f"            ... and {len(data) - list_torrents_count} more torrents")
             print("")
-        
+
+    if strata_info is not None:
+        print_sample_estimates(strata_info, "matching torrents", {h: 1 for h in df['Hash']}, dict(zip(df['Hash'], df['Size'])))
+        for message in message_counts.index:
+            selection = df[df['Message'] == message]
+            count, count_ci = extrapolate(strata_info, {h: 1 for h in selection['Hash']})
+            size, size_ci = extrapolate(strata_info, dict(zip(selection['Hash'], selection['Size'])))
+            print(f"    {count:>8.0f} ± {count_ci:<6.0f} torrents {size / (1024 ** 3):>10.2f} ± {size_ci / (1024 ** 3):<8.2f} GiB  {message}")
+
     if delete:
         # ask if the user wants to delete the torrents
         confirm = "n"
@@ -238,30 +534,77 @@ def list_tracker_messages(client: Client, no_progress: bool = False, tracker_reg
         print("")
         
         
-def show_unused_files(client: Client, no_progress: bool = False, path_prefix: str = '', full: bool = False, delete: bool = False, yes_do_as_i_say: bool = False):
+def verify_piece(client: Client, torrent_hash: str, file_path: str, offset: int, size: int, piece_start: int, piece_cache: Dict) -> Optional[bool]:
+    # Compare the first piece that lies completely inside the file against the torrent's piece hash.
+    # Returns None if the torrent has no such piece or no v1 piece hashes, so the match can not be verified.
+    if torrent_hash not in piece_cache:
+        piece_cache[torrent_hash] = (client.torrents_properties(torrent_hash).piece_size, client.torrents_piece_hashes(torrent_hash))
+    piece_size, piece_hashes = piece_cache[torrent_hash]
+    if piece_start is not None and offset // piece_size != piece_start:
+        # pad files (e.g. hybrid torrents) are not listed by the API, they align every file to a piece boundary
+        offset = piece_start * piece_size
+    piece = -(-offset // piece_size) # first piece starting inside the file
+    if (piece + 1) * piece_size > offset + size or piece >= len(piece_hashes) or len(piece_hashes[piece]) != 40:
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(piece * piece_size - offset)
+            data = f.read(piece_size)
+    except OSError as e:
+        print(f"Error reading {file_path}: {e}")
+        return None
+    return hashlib.sha1(data).hexdigest() == piece_hashes[piece].lower()
+
+def match_moved_file(client: Client, file_path: str, size: int, file_index: Dict, claimed: set, verify: bool, piece_cache: Dict) -> Optional[Tuple[object, str, Optional[bool]]]:
+    # Look up an orphaned file by (size, basename) among all torrent files whose expected location is missing.
+    # Returns (torrent, expected_path, verified) for the best candidate or None.
+    unverified = None
+    for torrent, expected_path, offset, piece_start in file_index.get((size, os.path.basename(file_path)), []):
+        if expected_path in claimed or os.path.exists(expected_path):
+            continue
+        if not verify:
+            return torrent, expected_path, None
+        verified = verify_piece(client, torrent.hash, file_path, offset, size, piece_start, piece_cache)
+        if verified:
+            return torrent, expected_path, True
+        if verified is None and unverified is None:
+            unverified = (torrent, expected_path, None)
+    return unverified
+
+def show_unused_files(client: Client, no_progress: bool = False, path_prefix: str = '', full: bool = False, delete: bool = False, yes_do_as_i_say: bool = False, verify_pieces: bool = False, relocation_plan: str = None):
 
     torrent_files = {} # file: [torrents]
+    file_index = defaultdict(list) # (size, basename): [(torrent, expected_path, offset, piece_start)]
     
     print("Client version: "+client.app_version())
     print("Client app_default_save_path: "+client.app_default_save_path())
     
-    total = len(client.torrents_info())
-    current = 0
-    for torrent in client.torrents_info():
-        current += 1
-        if not no_progress:
-            print("Get files of torrents ["+"#"*int(current*20/total)+" "*int((total-current)*20/total)+"] "+f"{(100*current//total)}% {current}/{total}", end='\r')
+    steps = Progress("unusedfiles", 3, enabled=not no_progress, show_rate=False)
+    torrents = client.torrents_info()
+    progress = Progress("Get files of torrents", len(torrents), enabled=not no_progress)
+    for torrent in torrents:
+        progress.update()
         trackerlist = client.torrents_trackers(torrent.hash)
         if not trackerlist:
             print(f"Warning: No trackers found for torrent {torrent.name}")
             continue
         
         # Iterate over all files in the torrent
-        for file in torrent.files:
+        offset = 0 # byte offset of the file within the torrent, needed to locate its pieces
+        for file in sorted(torrent.files, key=lambda f: f.index):
             file_path = path_prefix + os.path.join(client.app_default_save_path(), file.name)
             if os.path.abspath(file_path) not in torrent_files:
                 torrent_files[os.path.abspath(file_path)] = []
             torrent_files[os.path.abspath(file_path)].append(torrent)
+            # moved files are matched against where the torrent itself expects them, which includes category save paths.
+            # That location is in use as well, so a file can only be matched as moved when no torrent expects it where it is.
+            expected_path = os.path.abspath(path_prefix + os.path.join(torrent.save_path or client.app_default_save_path(), file.name))
+            if expected_path != os.path.abspath(file_path):
+                torrent_files.setdefault(expected_path, []).append(torrent)
+            file_index[(file.size, os.path.basename(file.name))].append((torrent, expected_path, offset, file.piece_range[0] if file.piece_range else None))
+            offset += file.size
+    progress.close()
+    steps.update()
             
     torrent_parent_dir = path_prefix + client.app_default_save_path()
     print(f"Looking for files in {torrent_parent_dir}")
@@ -270,22 +613,40 @@ def show_unused_files(client: Client, no_progress: bool = False, path_prefix: st
     unused_file_size = 0
     softlink_count = 0
     hardlink_count = 0
+    moved_files = [] # (file, torrent, expected_path, verified)
+    moved_file_size = 0
+    claimed = set()
+    piece_cache = {} # torrent hash: (piece_size, piece_hashes)
     # use os walk
-    total_count = sum([len(files) for _, _, files in os.walk(torrent_parent_dir)])
-    torrent_count = current
-    current = 0
+    total_count = 0
+    with Progress("Counting files", enabled=not no_progress) as progress:
+        for _, _, files in os.walk(torrent_parent_dir):
+            total_count += len(files)
+            progress.update(len(files))
+    steps.update()
+    torrent_count = len(torrents)
+    progress = Progress("Scanning files", total_count, enabled=not no_progress)
     for root, dirs, files in os.walk(torrent_parent_dir):
         for file in files:
-            current += 1
-            if not no_progress:
-                print("["+"#"*int(current*20/total_count)+" "*int((total_count-current)*20/total_count)+"] "+f"{(100*current//total_count)}% {current}/{total_count}", end='\r')
+            progress.update()
             if os.path.abspath(os.path.join(root, file)) not in torrent_files:
+                size = os.lstat(os.path.join(root, file)).st_size
+                match = match_moved_file(client, os.path.abspath(os.path.join(root, file)), size, file_index, claimed, verify_pieces, piece_cache)
+                if match:
+                    torrent, expected_path, verified = match
+                    claimed.add(expected_path)
+                    moved_files.append((os.path.abspath(os.path.join(root, file)), torrent, expected_path, verified))
+                    moved_file_size += size
+                    continue
                 unused_files.append(os.path.abspath(os.path.join(root, file)))
                 if os.path.islink(os.path.join(root, file)):
                     softlink_count += 1
                 elif os.stat(os.path.join(root, file)).st_nlink > 1:
                     hardlink_count += 1
                 unused_file_size += os.stat(os.path.join(root, file)).st_size
+    progress.close()
+    steps.update()
+    steps.close()
                 
     print(f"We searched through {torrent_count} torrents and {total_count} files.")
     print(f"Found {len(unused_files)} unused files with a total size of {unused_file_size / (1024 ** 4):.2f} TiB:")
@@ -300,6 +661,29 @@ def show_unused_files(client: Client, no_progress: bool = False, path_prefix: st
     else:
         for file in unused_files:
             print(f"    {file}")
+    if moved_files:
+        print(f"Found {len(moved_files)} files with a total size of {moved_file_size / (1024 ** 4):.2f} TiB that match a missing file of a torrent by size and name.")
+        print("  These are probably moved/renamed in qBittorrent and are not considered unused:")
+        if verify_pieces:
+            print(f"  of which {sum(1 for m in moved_files if m[3])} are verified by piece hash, {sum(1 for m in moved_files if m[3] is None)} could not be verified")
+        for file, torrent, expected_path, verified in (moved_files if full else moved_files[:10]):
+            print(f"    {file}")
+            print(f"        -> {expected_path} ({torrent.name}){' [verified]' if verified else ''}")
+        if not full and len(moved_files) > 10:
+            print(f"    {len(moved_files) - 10} more files")
+    if relocation_plan:
+        # always (over)write the plan, so a plan left over from an earlier run can not be mistaken for this one
+        with open(relocation_plan, 'w') as f:
+            f.write("#!/bin/sh\n")
+            f.write("# Relocation plan generated by qbmanage unusedfiles, moves orphaned files to where their torrent expects them\n")
+            for file, torrent, expected_path, verified in moved_files:
+                f.write(f"\n# {torrent.name} ({torrent.hash}){' verified' if verified else ''}\n")
+                f.write(f"mkdir -p {shlex.quote(os.path.dirname(expected_path))}\n")
+                f.write(f"mv -n {shlex.quote(file)} {shlex.quote(expected_path)}\n")
+        if moved_files:
+            print(f"Wrote relocation plan for {len(moved_files)} files to {relocation_plan}, recheck the torrents in qBittorrent after running it")
+        else:
+            print(f"No moved/renamed files found, wrote an empty relocation plan to {relocation_plan}")
     
     if delete:
         confirm = "n"
@@ -386,10 +770,14 @@ class MyTorrent:
 
 class MyTorrentList(List[MyTorrent]):
     trackers = set()
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, sample: Tuple[str, float] = None, sample_seed: int = None, no_progress: bool = False):
         super().__init__()
         time_a = time.time()
         self.client = client
+        self.no_progress = no_progress
+        self.sample = sample
+        self.sample_seed = sample_seed
+        self.strata_info = None
         self.update_torrents()
         time_b = time.time()
         print(f"Time to retrieve data and trackers for all torrents: {time_b - time_a:.2f}s")
@@ -402,34 +790,38 @@ class MyTorrentList(List[MyTorrent]):
 
     def update_torrents(self):
         self.clear()
-        current = 0
         torrents = self.client.torrents_info()
-        total = len(torrents)
-        for torrent in torrents:
-            current += 1
-            print(f"Updating torrents ["+"#"*int(current*20/total)+" "*int((total-current)*20/total)+"] "+f"{(100*current//total)}% {current}/{total}", end='\r')
-            myTorrent = MyTorrent(torrent)
-            self.append(myTorrent)
-            for tr in myTorrent.trackerlist:
-                if tr in self.trackers:
-                    self.trackers.add(tr)
+        if self.sample:
+            # Only the sampled torrents get their files and trackers fetched
+            torrents, self.strata_info = stratified_sample(torrents, self.sample, self.sample_seed)
+        with Progress("Updating torrents", len(torrents), enabled=not self.no_progress) as progress:
+            for torrent in torrents:
+                progress.update()
+                myTorrent = MyTorrent(torrent)
+                self.append(myTorrent)
+                for tr in myTorrent.trackerlist:
+                    if tr in self.trackers:
+                        self.trackers.add(tr)
     def __repr__(self):
         return f"MyTorrentList(torrents={self.torrents})"
 
-def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], exclude_messages: list[str] = [], exclude_hashes: list[str] = [], exclude_categories: list[str] = [], exclude_tags: list[str] = [], include_trackers: list[str] = [], include_messages: list[str] = [], include_hashes: list[str] = [], include_categories: list[str] = [], include_tags: list[str] = [], min_unlinked_size_abs: float = sys.float_info.min, min_unlinked_size_rel: float = sys.float_info.min, min_torrent_age: float = 14, no_progress: bool = False, delete: bool = False, yes_do_as_i_say: bool = False, path_prefix: str = ''):
+def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], exclude_messages: list[str] = [], exclude_hashes: list[str] = [], exclude_categories: list[str] = [], exclude_tags: list[str] = [], include_trackers: list[str] = [], include_messages: list[str] = [], include_hashes: list[str] = [], include_categories: list[str] = [], include_tags: list[str] = [], min_unlinked_size_abs: float = sys.float_info.min, min_unlinked_size_rel: float = sys.float_info.min, min_torrent_age: float = 14, no_progress: bool = False, delete: bool = False, yes_do_as_i_say: bool = False, path_prefix: str = '', sample: Tuple[str, float] = None, sample_seed: int = None, exclude_message_categories: list[str] = [], include_message_categories: list[str] = [], message_rules: List[Dict] = DEFAULT_MESSAGE_RULES):
     
     cmd_start_time = time.time()
+    classifier = TrackerMessageClassifier(message_rules)
     
     exclude_tracker_matches = [re.compile(tr, re.IGNORECASE) for tr in exclude_trackers] if exclude_trackers else []
     exclude_message_matches = [re.compile(msg, re.IGNORECASE) for msg in exclude_messages] if exclude_messages else []
     exclude_hash_matches = [re.compile(h, re.IGNORECASE) for h in exclude_hashes] if exclude_hashes else []
     exclude_category_matches = [re.compile(c, re.IGNORECASE) for c in exclude_categories] if exclude_categories else []
     exclude_tag_matches = [re.compile(t, re.IGNORECASE) for t in exclude_tags] if exclude_tags else []
+    exclude_message_category_matches = [re.compile(c, re.IGNORECASE) for c in exclude_message_categories] if exclude_message_categories else []
     include_tracker_matches = [re.compile(tr, re.IGNORECASE) for tr in include_trackers] if include_trackers else []
     include_message_matches = [re.compile(msg, re.IGNORECASE) for msg in include_messages] if include_messages else []
     include_hash_matches = [re.compile(h, re.IGNORECASE) for h in include_hashes] if include_hashes else []
     include_category_matches = [re.compile(c, re.IGNORECASE) for c in include_categories] if include_categories else []
     include_tag_matches = [re.compile(t, re.IGNORECASE) for t in include_tags] if include_tags else []
+    include_message_category_matches = [re.compile(c, re.IGNORECASE) for c in include_message_categories] if include_message_categories else []
     
     print("Mathing's that are active:")
     print(f"  Exclude trackers: {exclude_tracker_matches}")
@@ -437,11 +829,13 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
     print(f"  Exclude hashes: {exclude_hash_matches}")
     print(f"  Exclude categories: {exclude_category_matches}")
     print(f"  Exclude tags: {exclude_tag_matches}")
+    print(f"  Exclude message categories: {exclude_message_category_matches}")
     print(f"  Include trackers: {include_tracker_matches}")
     print(f"  Include messages: {include_message_matches}")
     print(f"  Include hashes: {include_hash_matches}")
     print(f"  Include categories: {include_category_matches}")
     print(f"  Include tags: {include_tag_matches}")
+    print(f"  Include message categories: {include_message_category_matches}")
     
     print("path_prefix: "+path_prefix)
     
@@ -469,7 +863,9 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
     
     print("Retrieving torrents...")
     time_before = time.time()
-    myTorrents = MyTorrentList(client)
+    steps = Progress("unlinkedfiles", 3, enabled=not no_progress, show_rate=False)
+    myTorrents = MyTorrentList(client, sample, sample_seed, no_progress)
+    steps.update()
     
     for torrent in myTorrents[:10]:
         print(f"    {torrent.name:<120} ({torrent.hash:<40}) {torrent.size / (1024 ** 3):>10.2f} GiB {torrent.state_enum:<20} {torrent.trackerlist[0].url if torrent.trackerlist else 'No tracker'}")
@@ -477,16 +873,14 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
     
     
     total = len(myTorrents)
-    current = 0
     time_a = 0
     time_b = 0
     time_c = 0
     time_d = 0
+    progress = Progress("Handle unlinked files", total, enabled=not no_progress)
     for torrent in myTorrents:
-        current += 1
+        progress.update()
         time_before = time.time()
-        if not no_progress:
-            print(f"Handle unlinked files ["+"#"*int(current*20/total)+" "*int((total-current)*20/total)+"] "+f"{(100*current//total)}% {current}/{total} "+f"{int(time_a/(time_a+time_b+time_c+time_d)*100):>3}% {int(time_b/(time_a+time_b+time_c+time_d)*100):>3}% {int(time_c/(time_a+time_b+time_c+time_d)*100):>3}% {int(time_d/(time_a+time_b+time_c+time_d)*100):>3}% " if (time_a + time_b + time_c + time_d > 0) else "", end='\r')
         trackerlist = None
         try:
             trackerlist = torrent.trackerlist
@@ -500,20 +894,19 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
         time_before = time.time()
         # Use the first tracker as the main one
         tracker_obj = None
+        category, msg = 'none', ''
         for tracker in trackerlist:
             tracker_obj = tracker
             if tracker_obj.url.startswith('**'):
                 continue
-            msg = tracker_obj.msg
-            if msg.startswith('You last announced'):
-                msg = "You last announced X seconds ago. Please respect the min interval."
+            category, msg = classifier.classify(tracker_host(tracker_obj.url), tracker_obj.msg)
             if not tracker_obj:
                 print(f"Warning: No enabled trackers found for torrent {torrent.name}")
                 continue
             if len(msg) == 0:
                 continue
 
-        trackers[torrent.hash] = tracker_obj.url.replace('https://', '').replace('http://', '').split('/')[0]
+        trackers[torrent.hash] = tracker_host(tracker_obj.url)
         
         time_b += time.time() - time_before
         time_before = time.time()
@@ -547,7 +940,6 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
         if min_unlinked_size_rel is not None and torrent.size > 0 and ((100 * unlinked_size / torrent.size) if torrent.size > 0 else 100) < min_unlinked_size_rel:
             continue
         
-        print(type(torrent))
         if min_torrent_age is not None and min_torrent_age * 24 * 3600 > torrent.time_active:
             continue
                 
@@ -563,6 +955,8 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
             continue
         if exclude_tag_matches and any(exclude_tag_match.search(torrent.tags) for exclude_tag_match in exclude_tag_matches):
             continue
+        if exclude_message_category_matches and any(exclude_message_category_match.search(category) for exclude_message_category_match in exclude_message_category_matches):
+            continue
         if include_tracker_matches and not any(include_tracker_match.search(tracker_obj.url) for include_tracker_match in include_tracker_matches):
             continue
         if include_message_matches and not any(include_message_match.search(msg) for include_message_match in include_message_matches):
@@ -573,10 +967,14 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
             continue
         if include_tag_matches and not any(include_tag_match.search(torrent.tags) for include_tag_match in include_tag_matches):
             continue
+        if include_message_category_matches and not any(include_message_category_match.search(category) for include_message_category_match in include_message_category_matches):
+            continue
         if len(unlinked_files_of_this_torrent) != 0:
             torrents_to_consider[torrent] = unlinked_files_of_this_torrent
             
         time_d += time.time() - time_before
+    progress.close()
+    steps.update()
         
     print(f"Time taken to get torrents: {time_a:.2f}s ~ {time_a/total:.2f}s/torrent or {time_a/(time_a+time_b+time_c+time_d)*100:.2f}%")
     print(f"Time taken to get trackers: {time_b:.2f}s ~ {time_b/total:.2f}s/torrent or {time_b/(time_a+time_b+time_c+time_d)*100:.2f}%")
@@ -590,15 +988,13 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
     df = pd.DataFrame(columns=['Torrent_Name', 'Hash', 'Size', 'Unlinked_Size', 'Tracker'])
     
     current = 0
-    total = len(torrents_to_consider)
-    
+    progress = Progress("Extracting data from torrents", len(torrents_to_consider), enabled=not no_progress)
 
     for torrent, unlinked_files in torrents_to_consider.items():
         if current == 0:
             print(f"  {torrent.hash}: {','.join(unlinked_files)}")
         current += 1
-        if not no_progress:
-            print("Extracting data from torrents ["+"#"*int(current*20/total)+" "*int((total-current)*20/total)+"] "+f"{(100*current//total)}% {current}/{total}", end='\r')
+        progress.update()
         if torrent.hash not in trackers:
             print(f"Warning: No tracker found for torrent {torrent.name}")
             continue
@@ -612,6 +1008,9 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
             'Unlinked_Size': [sum(os.stat(file).st_size for file in unlinked_files)],
             'Tracker': [trackers[torrent.hash]]
         })], ignore_index=True)
+    progress.close()
+    steps.update()
+    steps.close()
         
     print(f"Found {len(df)} torrents with unlinked files:")
 
@@ -646,6 +1045,9 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
     print(f"Total amount of unlinked files: {sum(1 for files in torrents_to_consider.values() for file in files)}")
     print(f"Total size of unlinked files: {sum(os.stat(file).st_size for files in torrents_to_consider.values() for file in files) / (1024 ** 4):.2f} TiB")
 
+    if myTorrents.strata_info is not None:
+        print_sample_estimates(myTorrents.strata_info, "torrents with unlinked files", {h: 1 for h in df['Hash']}, dict(zip(df['Hash'], df['Unlinked_Size'])))
+
     if delete:
         hashes_to_delete = [torrent.hash for torrent in torrents_to_consider.keys()]
         files_candidates = set(file for files in torrents_to_consider.values() for file in files)
@@ -659,13 +1061,12 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
             # Rescan remaining torrents to find which files are still referenced
             print("Rescanning remaining torrents to check which files are still in use...")
             remaining_files = set()
-            total = len(client.torrents_info())
-            current = 0
-            for torrent in client.torrents_info():
-                current += 1
-                print(f"Scanning torrent {current} of {total}", end='\r')
-                for file in torrent.files:
-                    remaining_files.add(os.path.abspath(os.path.join(root_dir, file.name)))
+            remaining_torrents = client.torrents_info()
+            with Progress("Scanning torrents", len(remaining_torrents), enabled=not no_progress) as progress:
+                for torrent in remaining_torrents:
+                    progress.update()
+                    for file in torrent.files:
+                        remaining_files.add(os.path.abspath(os.path.join(root_dir, file.name)))
 
             files_to_delete = [f for f in files_candidates if f not in remaining_files]
             files_still_in_use = [f for f in files_candidates if f in remaining_files]
@@ -695,11 +1096,151 @@ def handle_unlinked_files(client: Client, exclude_trackers: list[str] = [], excl
     print(f"Entire command took {time.time() - cmd_start_time:.2f}s")
         
 
+METRICS = {
+    # name: (type, help)
+    'qbmanage_torrents': ('gauge', 'Number of torrents'),
+    'qbmanage_torrent_size_bytes': ('gauge', 'Total size of torrents in bytes'),
+    'qbmanage_downloaded_bytes': ('gauge', 'Total amount downloaded by torrents in bytes'),
+    'qbmanage_uploaded_bytes': ('gauge', 'Total amount uploaded by torrents in bytes'),
+    'qbmanage_ratio': ('gauge', 'Uploaded divided by downloaded bytes'),
+    'qbmanage_tracker_message_torrents': ('gauge', 'Number of torrents whose tracker is not working, by message category'),
+    'qbmanage_unlinked_bytes': ('gauge', 'Size of torrent files that are not hardlinked anywhere else in bytes'),
+    'qbmanage_missing_bytes': ('gauge', 'Size of torrent files that do not exist on disk in bytes'),
+    'qbmanage_unused_files': ('gauge', 'Number of files in the save path that belong to no torrent'),
+    'qbmanage_unused_bytes': ('gauge', 'Size of files in the save path that belong to no torrent in bytes'),
+    'qbmanage_snapshot_timestamp_seconds': ('gauge', 'Unix time the last snapshot was started'),
+    'qbmanage_snapshot_duration_seconds': ('gauge', 'Time it took to compute the last snapshot'),
+    'qbmanage_snapshot_success': ('gauge', 'Whether the last snapshot refresh succeeded'),
+}
+
+def collect_metrics(client: Client, path_prefix: str = '', disk: bool = True, classifier: TrackerMessageClassifier = None) -> Dict[str, Dict[tuple, float]]:
+    # Compute all aggregations in one pass, metrics: {name: {labels: value}} with labels as tuple of (key, value) pairs
+    classifier = classifier or TrackerMessageClassifier()
+    metrics = defaultdict(lambda: defaultdict(float))
+    root_dir = path_prefix + client.app_default_save_path()
+    referenced_files = set()
+    for torrent in client.torrents_info():
+        try:
+            trackerlist = [tr for tr in client.torrents_trackers(torrent.hash) if not tr.get('url', '').startswith('**')]
+            files = torrent.files if disk else []
+        except NotFound404Error:
+            # removed since torrents_info(), e.g. by Sonarr/Radarr, skip it instead of failing the whole refresh
+            continue
+        # Use the first tracker as the main one
+        tracker = tracker_host(trackerlist[0].get('url', '')) if trackerlist else 'No tracker'
+        labels = (('tracker', tracker), ('category', torrent.category or ''))
+        metrics['qbmanage_torrents'][labels] += 1
+        metrics['qbmanage_torrent_size_bytes'][labels] += torrent.size
+        metrics['qbmanage_downloaded_bytes'][labels] += torrent.downloaded
+        metrics['qbmanage_uploaded_bytes'][labels] += torrent.uploaded
+        for tr in trackerlist:
+            # status 4: Tracker has been contacted, but it is not working (same selection as listmessages)
+            if len(tr.get('msg', '')) == 0 or tr.get('status', 0) != 4:
+                continue
+            # only the category becomes a label, raw messages may contain ids or counts and would make the label unbounded
+            category, msg = classifier.classify(tracker_host(tr.get('url', '')), tr.get('msg', ''))
+            metrics['qbmanage_tracker_message_torrents'][labels + (('message_category', category),)] += 1
+            break
+        for file in files:
+            file_path = os.path.abspath(os.path.join(root_dir, file.name))
+            referenced_files.add(file_path)
+            try:
+                st = os.lstat(file_path)
+            except FileNotFoundError:
+                metrics['qbmanage_missing_bytes'][labels] += file.size
+                continue
+            if stat.S_ISLNK(st.st_mode) or st.st_nlink > 1:
+                continue
+            metrics['qbmanage_unlinked_bytes'][labels] += st.st_size
+    for labels, downloaded in metrics['qbmanage_downloaded_bytes'].items():
+        metrics['qbmanage_ratio'][labels] = metrics['qbmanage_uploaded_bytes'][labels] / downloaded if downloaded > 0 else 0
+    if disk:
+        metrics['qbmanage_unused_files'][()] = 0
+        metrics['qbmanage_unused_bytes'][()] = 0
+        for root, dirs, files in os.walk(root_dir):
+            for file in files:
+                file_path = os.path.abspath(os.path.join(root, file))
+                if file_path in referenced_files:
+                    continue
+                try:
+                    metrics['qbmanage_unused_bytes'][()] += os.lstat(file_path).st_size
+                    metrics['qbmanage_unused_files'][()] += 1
+                except FileNotFoundError:
+                    pass
+    return metrics
+
+def render_metrics(metrics: Dict[str, Dict[tuple, float]]) -> bytes:
+    # Prometheus text exposition format 0.0.4
+    def escape(value: str) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        if name not in metrics:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(metrics[name].items()):
+            label_str = ','.join(f'{key}="{escape(val)}"' for key, val in labels)
+            lines.append(f"{name}{{{label_str}}} {value:.17g}" if label_str else f"{name} {value:.17g}")
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def serve_metrics(client: Client, path_prefix: str = '', listen: str = '127.0.0.1', port: int = 9877, interval: float = 300, disk: bool = True, message_rules: List[Dict] = DEFAULT_MESSAGE_RULES):
+    # Scrapes only ever read the last rendered snapshot, all API and disk access happens in the refresh thread
+    snapshot = {'body': render_metrics({'qbmanage_snapshot_success': {(): 0}})}
+
+    def refresh():
+        # the classifier lives as long as the server, so its cache carries over between refreshes
+        classifier = TrackerMessageClassifier(message_rules)
+        metrics = {}
+        while True:
+            time_before = time.time()
+            success = 1
+            try:
+                metrics = collect_metrics(client, path_prefix, disk, classifier)
+            except Exception as e:
+                # keep serving the previous values, but flag the failed refresh
+                print(f"Error refreshing metrics: {e}")
+                success = 0
+            duration = time.time() - time_before
+            snapshot['body'] = render_metrics({**metrics,
+                'qbmanage_snapshot_timestamp_seconds': {(): time_before},
+                'qbmanage_snapshot_duration_seconds': {(): duration},
+                'qbmanage_snapshot_success': {(): success},
+            })
+            print(f"Metrics refreshed in {duration:.2f}s")
+            time.sleep(interval)
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = snapshot['body']
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    threading.Thread(target=refresh, daemon=True).start()
+    server = ThreadingHTTPServer((listen, port), MetricsHandler)
+    print(f"Serving metrics on http://{listen}:{port}/metrics, refreshing every {interval}s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("")
+    finally:
+        server.server_close()
+
 def main():
     parser = argparse.ArgumentParser(description='qBit Management Tool')
     
     parser.add_argument('--config', default='config.yml', help='Path to the config file (default: config.yml)')
     parser.add_argument('--path-prefix', default='', help='Path prefix for torrent files (default: empty)')
+    parser.add_argument('--status-interval', type=float, default=60, help='Seconds between progress status lines when the output is not a terminal, e.g. under cron (default: 60)')
     
     subparsers = parser.add_subparsers(dest='command', required=True)
 
@@ -716,15 +1257,20 @@ def main():
     list_parser.add_argument('--message', nargs='+', help='Filter by one or more messages, in regex format, e.g. ".*unregistered.*" ".*error.*"')
     list_parser.add_argument('--hash', nargs='+', help='Filter by one or more torrent hashes, in regex format, e.g. ".*hash1.*" ".*hash2.*"')
     list_parser.add_argument('--torrent', nargs='+', help='Filter by one or more torrent names, in regex format, e.g. ".*torrent1.*" ".*torrent2.*"')
+    list_parser.add_argument('--message-category', nargs='+', help='Filter by one or more message categories, in regex format, e.g. "unregistered" "deleted"')
     list_parser.add_argument('--full', action='store_true', help='Show all torrents affected, not just the first 10')
     list_parser.add_argument('--delete', action='store_true', help='Delete torrents with matching messages')
     list_parser.add_argument('--yes-do-as-i-say', action='store_true', help='Delete torrents with matching messages without asking for confirmation')
+    list_parser.add_argument('--sample', type=parse_sample, help='Only process a stratified random sample of torrents (by tracker and category) and extrapolate the totals, either a number of torrents e.g. "500" or a percentage e.g. "5%%"')
+    list_parser.add_argument('--sample-seed', type=int, help='Seed for --sample, to get the same sample on every run while tuning filters')
 
     unused_parser = subparsers.add_parser('unusedfiles', help='Find files in torrent directory that are not used in any torrent')
     unused_parser.add_argument('--no-progress', '--np', action='store_true', help='Disable progress bar')
     unused_parser.add_argument('--full', action='store_true', help='Show all torrents affected, not just the first 10')
     unused_parser.add_argument('--delete', action='store_true', help='Delete files that are not used in any torrent')
     unused_parser.add_argument('--yes-do-as-i-say', action='store_true', help='Delete files that are not used in any torrent without asking for confirmation')
+    unused_parser.add_argument('--verify-pieces', action='store_true', help='Verify files that look moved/renamed by hashing one piece and comparing it with the torrent\'s piece hash')
+    unused_parser.add_argument('--relocation-plan', help='Write a shell script to this path that moves files which look moved/renamed back to where their torrent expects them')
     
     unlinked_parser = subparsers.add_parser('unlinkedfiles', help='Find torrents that are not linked to any files')
     unlinked_parser.add_argument('--exclude-trackers', nargs='+', help='Exclude torrents with these trackers, in regex format, e.g. ".*blutopia.*" ".*example.*"')
@@ -732,32 +1278,50 @@ def main():
     unlinked_parser.add_argument('--exclude-hashes', nargs='+', help='Exclude torrents with these hashes, in regex format, e.g. ".*hash1.*" ".*hash2.*"')
     unlinked_parser.add_argument('--exclude-categories', nargs='+', help='Exclude torrents with these categories, in regex format, e.g. ".*category1.*" ".*category2.*"')
     unlinked_parser.add_argument('--exclude-tags', nargs='+', help='Exclude torrents with these tags, in regex format, e.g. ".*tag1.*" ".*tag2.*"')
+    unlinked_parser.add_argument('--exclude-message-categories', nargs='+', help='Exclude torrents with these message categories, in regex format, e.g. "rate-limited" "unreachable"')
     unlinked_parser.add_argument('--include-trackers', nargs='+', help='Include torrents with these trackers, in regex format, e.g. ".*blutopia.*" ".*example.*"')
     unlinked_parser.add_argument('--include-messages', nargs='+', help='Include torrents with these messages, in regex format, e.g. ".*unregistered.*" ".*error.*"')
     unlinked_parser.add_argument('--include-hashes', nargs='+', help='Include torrents with these hashes, in regex format, e.g. ".*hash1.*" ".*hash2.*"')
     unlinked_parser.add_argument('--include-categories', nargs='+', help='Include torrents with these categories, in regex format, e.g. ".*category1.*" ".*category2.*"')
     unlinked_parser.add_argument('--include-tags', nargs='+', help='Include torrents with these tags, in regex format, e.g. ".*tag1.*" ".*tag2.*"')
+    unlinked_parser.add_argument('--include-message-categories', nargs='+', help='Include torrents with these message categories, in regex format, e.g. "unregistered" "deleted"')
     unlinked_parser.add_argument('--min-unlinked-size-abs', type=float, help='Minimum total size of unlinked files to consider a torrent as unlinked, in GiB', default=1/(1024 ** 3)) # default to 1 byte
     unlinked_parser.add_argument('--min-unlinked-size-rel', type=float, help='Minimum total size of unlinked files relative to the torrent size to consider a torrent as unlinked, in percentage, e.g. 50 for 50%%', default=sys.float_info.min) # small number larger than 0
     unlinked_parser.add_argument('--min-torrent-age', type=float, help='Minimum age of torrent to consider for unlinked files, in days', default=14) # default to 14 days
     unlinked_parser.add_argument('--no-progress', '--np', action='store_true', help='Disable progress bar')
     unlinked_parser.add_argument('--delete', action='store_true', help='Delete torrents that are not linked to any files')
     unlinked_parser.add_argument('--yes-do-as-i-say', action='store_true', help='Delete torrents that are not linked to any files without asking for confirmation')
+    unlinked_parser.add_argument('--sample', type=parse_sample, help='Only process a stratified random sample of torrents (by tracker and category) and extrapolate the totals, either a number of torrents e.g. "500" or a percentage e.g. "5%%"')
+    unlinked_parser.add_argument('--sample-seed', type=int, help='Seed for --sample, to get the same sample on every run while tuning filters')
+
+    metrics_parser = subparsers.add_parser('serve-metrics', help='Serve Prometheus metrics on a local HTTP /metrics endpoint')
+    metrics_parser.add_argument('--listen', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    metrics_parser.add_argument('--port', type=int, default=9877, help='Port to listen on (default: 9877)')
+    metrics_parser.add_argument('--interval', type=float, default=300, help='Seconds to wait between two snapshot refreshes (default: 300)')
+    metrics_parser.add_argument('--no-disk-metrics', action='store_true', help='Skip the unlinked/unused/missing byte metrics, which require stat-ing all files on disk')
 
     args = parser.parse_args()
+    Progress.status_interval = args.status_interval
+    if getattr(args, 'sample', None) and args.delete:
+        parser.error('--sample only estimates, it can not be combined with --delete')
     config = load_config(args.config)
-    client = connect_qbit(config)
+    message_rules = None
+    if args.command in ('listmessages', 'unlinkedfiles', 'serve-metrics'):
+        message_rules = load_message_rules(config, args.config)
+    client = connect_qbit(config['qbit'])
 
     if args.command == 'status':
         qbit_status(client)
     elif args.command == 'overview':
         overview_torrents(client)
     elif args.command == 'listmessages':
-        list_tracker_messages(client, args.no_progress, args.tracker, args.message, args.hash, args.torrent, args.full, args.delete, args.yes_do_as_i_say, args.path_prefix)
+        list_tracker_messages(client, args.no_progress, args.tracker, args.message, args.hash, args.torrent, args.full, args.delete, args.yes_do_as_i_say, args.path_prefix, args.sample, args.sample_seed, args.message_category, message_rules)
     elif args.command == 'unusedfiles':
-        show_unused_files(client, args.no_progress, args.path_prefix, args.full, args.delete, args.yes_do_as_i_say)
+        show_unused_files(client, args.no_progress, args.path_prefix, args.full, args.delete, args.yes_do_as_i_say, args.verify_pieces, args.relocation_plan)
     elif args.command == 'unlinkedfiles':
-        handle_unlinked_files(client, args.exclude_trackers, args.exclude_messages, args.exclude_hashes, args.exclude_categories, args.exclude_tags, args.include_trackers, args.include_messages, args.include_hashes, args.include_categories, args.include_tags, args.min_unlinked_size_abs, args.min_unlinked_size_rel, args.min_torrent_age, args.no_progress, args.delete, args.yes_do_as_i_say, args.path_prefix)
+        handle_unlinked_files(client, args.exclude_trackers, args.exclude_messages, args.exclude_hashes, args.exclude_categories, args.exclude_tags, args.include_trackers, args.include_messages, args.include_hashes, args.include_categories, args.include_tags, args.min_unlinked_size_abs, args.min_unlinked_size_rel, args.min_torrent_age, args.no_progress, args.delete, args.yes_do_as_i_say, args.path_prefix, args.sample, args.sample_seed, args.exclude_message_categories, args.include_message_categories, message_rules)
+    elif args.command == 'serve-metrics':
+        serve_metrics(client, args.path_prefix, args.listen, args.port, args.interval, not args.no_disk_metrics, message_rules)
     
 
 if __name__ == '__main__':